@@ -2,27 +2,71 @@
 Telegram bot message handlers.
 """
 
-import os
+import time
+import random
+import weakref
+import functools
+from collections import OrderedDict
+from datetime import timedelta
+import asyncio
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, RetryAfter
+from telegram.helpers import escape_markdown
 from telegram.ext import ContextTypes, CallbackQueryHandler
 from spotify_handler import SpotifyHandler
-from youtube_handler import YouTubeHandler
-from utils import clean_filename, format_file_size
+from youtube_handler import download_track
+from config import Config
+from utils import clean_filename, format_file_size, read_audio_file, remove_file, remove_stale_files
 
 logger = logging.getLogger(__name__)
 
-class BotHandlers:
-    """Handles Telegram bot interactions."""
-    
-    def __init__(self):
-        """Initialize handlers."""
-        self.spotify = SpotifyHandler()
-        self.youtube = YouTubeHandler()
-    
-    async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /start command."""
-        welcome_message = """🎵 **Welcome to SpotifyDL Pro** 🎵
+# Number of uploaded tracks whose Telegram file_id is kept for re-sending
+AUDIO_CACHE_SIZE = 1024
+
+# Inline keyboards are identical for every user, so build them once
+START_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📖 How to Use", callback_data='help'),
+     InlineKeyboardButton("🎵 Try Demo", callback_data='demo')],
+    [InlineKeyboardButton("⭐ Rate Us", callback_data='rate'),
+     InlineKeyboardButton("📢 Share Bot", callback_data='share')]
+])
+
+HELP_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🏠 Back to Home", callback_data='start'),
+     InlineKeyboardButton("🎵 Try Now", callback_data='demo')]
+])
+
+DEMO_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🏠 Back to Home", callback_data='start')]
+])
+
+RATE_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📢 Share Bot", callback_data='share')],
+    [InlineKeyboardButton("🏠 Back to Home", callback_data='start')]
+])
+
+SHARE_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("⭐ Rate Us", callback_data='rate')],
+    [InlineKeyboardButton("🏠 Back to Home", callback_data='start')]
+])
+
+INVALID_LINK_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📖 How to Get Spotify Links", callback_data='help')],
+    [InlineKeyboardButton("🎵 Try Demo Link", callback_data='demo')]
+])
+
+SUCCESS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🎵 Download Another", callback_data='start')],
+    [InlineKeyboardButton("⭐ Rate SpotifyDL", callback_data='rate'),
+     InlineKeyboardButton("📢 Share Bot", callback_data='share')]
+])
+
+# Static screens shared by commands and button callbacks
+WELCOME_TEXT = """🎵 **Welcome to SpotifyDL Pro** 🎵
 
 Transform your Spotify discoveries into high-quality MP3 files instantly!
 
@@ -37,26 +81,8 @@ Transform your Spotify discoveries into high-quality MP3 files instantly!
 Just paste any Spotify track link and watch the magic happen!
 
 🚀 **Ready to get started?**"""
-        
-        # Create attractive buttons
-        keyboard = [
-            [InlineKeyboardButton("📖 How to Use", callback_data='help'),
-             InlineKeyboardButton("🎵 Try Demo", callback_data='demo')],
-            [InlineKeyboardButton("⭐ Rate Us", callback_data='rate'),
-             InlineKeyboardButton("📢 Share Bot", callback_data='share')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        if update.message:
-            await update.message.reply_text(
-                welcome_message, 
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
-    
-    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /help command."""
-        help_message = """🎯 **SpotifyDL Pro - Quick Guide**
+
+HELP_TEXT = """🎯 **SpotifyDL Pro - Quick Guide**
 
 **Step 1: Find Your Song** 🔍
 • Open Spotify (app or web)
@@ -87,17 +113,242 @@ Just paste any Spotify track link and watch the magic happen!
 📦 Up to 50MB file size
 
 **Ready to download?** Just paste a Spotify link below! 👇"""
+
+RATE_TEXT = """⭐ **Rate SpotifyDL Pro**
+
+Thank you for using our service! Your feedback helps us improve.
+
+Please rate us on:
+• Speed of download
+• Audio quality  
+• User experience
+• Overall satisfaction
+
+Share your experience with friends and family! 💝"""
+
+SHARE_TEXT = """📢 **Share SpotifyDL Pro**
+
+Love our service? Spread the word!
+
+📱 **Share this bot with friends:**
+`@SAN_Filebot (SpotifyDLProBot)`
+
+💬 **Tell them about:**
+• Lightning-fast downloads
+• Premium audio quality
+• Zero registration required
+• 100% free to use
+
+Thank you for helping us grow! 🚀"""
+
+# Rotating demo songs - popular hits
+DEMO_SONGS = (
+    ("Billie Eilish - BIRDS OF A FEATHER", "https://open.spotify.com/track/6dOtVTDdiauQNBQEDOtlAB"),
+    ("Sabrina Carpenter - Espresso", "https://open.spotify.com/track/2qSkIjg1o9h3YT9RAgYN75"),
+    ("Lady Gaga & Bruno Mars - Die With A Smile", "https://open.spotify.com/track/2plbrEY59IikOBgBGLjaoe"),
+    ("The Weeknd - Blinding Lights", "https://open.spotify.com/track/0VjIjW4GlUZAMYd2vXMi3b"),
+    ("Harry Styles - As It Was", "https://open.spotify.com/track/4LRPiXqCikLlN15c3yImP7"),
+    ("Wiz Khalifa - See You Again (feat. Charlie Puth)", "https://open.spotify.com/track/6UVjo42dT0yQXX0ogxeR9s"),
+)
+
+DEMO_TEXT_TEMPLATE = """🎵 **Try with this demo Spotify link:**
+
+*{song}*
+`{url}`
+
+Just copy and paste the link above to see SpotifyDL Pro in action! 🚀"""
+
+# Callback data -> (text, markup) for screens that never change
+STATIC_SCREENS = {
+    'start': (WELCOME_TEXT, START_MARKUP),
+    'help': (HELP_TEXT, HELP_MARKUP),
+    'rate': (RATE_TEXT, RATE_MARKUP),
+    'share': (SHARE_TEXT, SHARE_MARKUP),
+}
+
+# Static status and error messages sent while processing a link
+INVALID_LINK_MESSAGE = (
+    "❌ **Invalid Link Detected**\n\n"
+    "Please send a valid Spotify track link.\n"
+    "Example: `https://open.spotify.com/track/...`"
+)
+
+PROCESSING_MESSAGE = (
+    "🔄 **Processing your request...**\n"
+    "🎵 Analyzing Spotify track data..."
+)
+
+UNABLE_TO_PROCESS_MESSAGE = (
+    "❌ **Unable to Process Link**\n\n"
+    "The Spotify link appears to be invalid or the track is not available.\n"
+    "Please try with a different Spotify track link."
+)
+
+SERVICE_ISSUE_MESSAGE = (
+    "❌ **Temporary Service Issue**\n\n"
+    "We're experiencing high demand right now.\n"
+    "Please try again in a few moments!"
+)
+
+def log_callback_errors(func):
+    """Log and swallow errors raised while showing a callback screen."""
+    @functools.wraps(func)
+    async def wrapper(self, query, *args):
+        try:
+            return await func(self, query, *args)
+        except Exception as e:
+            logger.error("Error editing message for %s: %s", query.data, e)
+    return wrapper
+
+class SharedDownload:
+    """A track download shared by every concurrent request for it."""
+    
+    def __init__(self, task):
+        """Initialize with the running download task."""
+        self.task = task
+        self.users = 0
+
+class ProgressThrottler:
+    """Coalesces status edits of a single progress message."""
+    
+    def __init__(self, message, min_interval=1.5):
+        """Initialize throttler for the given message."""
+        self.message = message
+        self.min_interval = min_interval
+        self.last_sent = 0.0
+        self.last_text = message.text
+        self.pending = None
+        self.flush_task = None
+        self.flushing = False
+    
+    async def update(self, text, final=False, **kwargs):
+        """Edit the message, deferring intermediate updates sent too quickly."""
+        if final:
+            # Let a deferred edit already on the wire finish, so it cannot land after this one
+            if self.flushing:
+                self.pending = None
+                await asyncio.wait([self.flush_task])
+            self.cancel()
+            await self._send(text, kwargs)
+            return
         
-        keyboard = [
-            [InlineKeyboardButton("🏠 Back to Home", callback_data='start'),
-             InlineKeyboardButton("🎵 Try Now", callback_data='demo')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        delay = self.last_sent + self.min_interval - time.monotonic()
+        if delay <= 0 and not self.flush_task:
+            await self._send(text, kwargs)
+            return
         
+        # Keep only the latest intermediate text and flush it once the interval passes
+        self.pending = (text, kwargs)
+        if not self.flush_task:
+            self.flush_task = asyncio.create_task(self._flush_later(delay))
+    
+    def cancel(self):
+        """Drop any deferred update."""
+        self.pending = None
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+    
+    async def _flush_later(self, delay):
+        """Send pending updates, spaced by the minimum interval."""
+        try:
+            while self.pending:
+                await asyncio.sleep(max(delay, 0))
+                text, kwargs = self.pending
+                self.pending = None
+                self.flushing = True
+                try:
+                    await self._send(text, kwargs)
+                except Exception as e:
+                    logger.error("Error updating progress message: %s", e)
+                finally:
+                    self.flushing = False
+                delay = self.last_sent + self.min_interval - time.monotonic()
+        finally:
+            # Only clear our own slot; cancel() may already have replaced it
+            if self.flush_task is asyncio.current_task():
+                self.flush_task = None
+    
+    async def _send(self, text, kwargs):
+        """Edit the message immediately, honouring Telegram flood waits."""
+        # Telegram rejects edits that do not change the message
+        if text == self.last_text:
+            return
+        
+        self.last_sent = time.monotonic()
+        try:
+            await self.message.edit_text(text, **kwargs)
+        except RetryAfter as e:
+            # The rate limiter has already retried; hold back further edits until the wait is over
+            delay = e.retry_after
+            if isinstance(delay, timedelta):
+                delay = delay.total_seconds()
+            self.last_sent = time.monotonic() + delay
+            logger.warning("Skipping progress update, flood wait of %ss", delay)
+            return
+        self.last_text = text
+
+class BotHandlers:
+    """Handles Telegram bot interactions."""
+    
+    def __init__(self):
+        """Initialize handlers."""
+        self.spotify = SpotifyHandler()
+        
+        # yt-dlp runs in separate processes so downloads for different users
+        # proceed in parallel without contending for the GIL
+        self._download_pool = self._new_download_pool()
+        
+        # Bounded pool for blocking Spotify and filesystem calls
+        self._io_pool = ThreadPoolExecutor(
+            max_workers=Config.IO_WORKERS,
+            thread_name_prefix='io'
+        )
+        
+        # Downloads in flight, keyed by search query
+        self._downloads = {}
+        
+        # Telegram file_ids of uploaded tracks, keyed by Spotify track ID (LRU)
+        self._audio_cache = OrderedDict()
+        
+        # Per-chat locks; entries disappear once no request holds them
+        self._chat_locks = weakref.WeakValueDictionary()
+        
+        # Callback data -> handler for screens built per click
+        self._callback_handlers = {
+            'demo': self._show_demo,
+        }
+        
+        # Background sweep of files left behind in TEMP_DIR
+        self._sweep_task = None
+    
+    async def post_init(self, application):
+        """Start background maintenance once the event loop is running."""
+        self._sweep_task = asyncio.create_task(self._sweep_temp_dir())
+    
+    async def shutdown(self, application):
+        """Release resources held by the handlers."""
+        if self._sweep_task:
+            self._sweep_task.cancel()
+        self.spotify.close()
+        self._download_pool.shutdown(wait=False, cancel_futures=True)
+        self._io_pool.shutdown(wait=False, cancel_futures=True)
+    
+    async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /start command."""
         if update.message:
             await update.message.reply_text(
-                help_message,
-                reply_markup=reply_markup,
+                WELCOME_TEXT,
+                reply_markup=START_MARKUP,
+                parse_mode='Markdown'
+            )
+    
+    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /help command."""
+        if update.message:
+            await update.message.reply_text(
+                HELP_TEXT,
+                reply_markup=HELP_MARKUP,
                 parse_mode='Markdown'
             )
     
@@ -110,139 +361,247 @@ Just paste any Spotify track link and watch the magic happen!
         
         # Check if message contains Spotify URL
         if not self.spotify.is_spotify_url(message_text):
-            error_keyboard = [
-                [InlineKeyboardButton("📖 How to Get Spotify Links", callback_data='help')],
-                [InlineKeyboardButton("🎵 Try Demo Link", callback_data='demo')]
-            ]
-            error_markup = InlineKeyboardMarkup(error_keyboard)
-            
             await update.message.reply_text(
-                "❌ **Invalid Link Detected**\n\n"
-                "Please send a valid Spotify track link.\n"
-                "Example: `https://open.spotify.com/track/...`",
-                reply_markup=error_markup,
+                INVALID_LINK_MESSAGE,
+                reply_markup=INVALID_LINK_MARKUP,
                 parse_mode='Markdown'
             )
             return
         
         # Send processing message with progress
         processing_msg = await update.message.reply_text(
-            "🔄 **Processing your request...**\n"
-            "🎵 Analyzing Spotify track data...",
+            PROCESSING_MESSAGE,
             parse_mode='Markdown'
         )
-        downloaded_file = None
         
-        try:
-            # Process Spotify URL
-            spotify_data = self.spotify.process_spotify_url(message_text)
-            if not spotify_data:
-                await processing_msg.edit_text(
-                    "❌ **Unable to Process Link**\n\n"
-                    "The Spotify link appears to be invalid or the track is not available.\n"
-                    "Please try with a different Spotify track link.",
-                    parse_mode='Markdown'
-                )
-                return
-            
-            track_info = spotify_data['track_info']
-            search_query = spotify_data['search_query']
-            
-            # Update message with found track info
-            await processing_msg.edit_text(
-                f"✅ **Track Identified Successfully!**\n\n"
-                f"🎵 **{track_info['name']}**\n"
-                f"👤 **{', '.join(track_info['artists'])}**\n"
-                f"💿 **{track_info['album']}**\n\n"
-                f"🔄 Preparing high-quality download...",
-                parse_mode='Markdown'
-            )
-            
-            # Process and download track
-            downloaded_file, error = self.youtube.process_download_request(search_query, track_info)
+        # Process the link in the background so updates from other chats are not held up
+        context.application.create_task(
+            self._process_link(update, message_text, processing_msg),
+            update=update
+        )
+    
+    async def _process_link(self, update, message_text, processing_msg):
+        """Identify, download and send a Spotify track."""
+        # Links from the same chat are processed one at a time, in order
+        async with self._get_chat_lock(update.effective_chat.id):
+            progress = ProgressThrottler(processing_msg)
+            shared = None
             
-            if error or not downloaded_file:
-                await processing_msg.edit_text(
-                    f"❌ **Download Failed**\n\n"
-                    f"{error or 'Unable to process this track at the moment.'}\n"
-                    f"Please try again with a different Spotify link.",
-                    parse_mode='Markdown'
+            try:
+                # Process Spotify URL in a worker thread; spotipy is blocking
+                spotify_data = await self._run_blocking(self.spotify.process_spotify_url, message_text)
+                if not spotify_data:
+                    await progress.update(
+                        UNABLE_TO_PROCESS_MESSAGE,
+                        final=True,
+                        parse_mode='Markdown'
+                    )
+                    return
+                
+                track_id = spotify_data['track_id']
+                track_info = spotify_data['track_info']
+                search_query = spotify_data['search_query']
+                
+                # Escape the track metadata once and reuse it in every status message
+                track_header = (
+                    f"🎵 **{escape_markdown(track_info['name'])}**\n"
+                    f"👤 **{escape_markdown(track_info['artists_str'])}**\n"
+                    f"💿 **{escape_markdown(track_info['album'])}**"
                 )
-                return
-            
-            # Check file size
-            file_size = os.path.getsize(downloaded_file)
-            if file_size > 50 * 1024 * 1024:  # 50MB limit
-                await processing_msg.edit_text(
-                    f"❌ **File Too Large**\n\n"
-                    f"This track ({format_file_size(file_size)}) exceeds Telegram's 50MB limit.\n"
-                    f"Please try a shorter track or different version.",
+                
+                # Tracks sent before are re-sent by Telegram file_id, skipping the download.
+                # Otherwise start the download (or join an identical one already running)
+                # before the status edit, so the Telegram round-trip overlaps with it.
+                file_id = self._get_cached_audio(track_id)
+                if not file_id:
+                    shared = self._join_download(search_query, track_info)
+                
+                # Update message with found track info
+                await progress.update(
+                    f"✅ **Track Identified Successfully!**\n\n"
+                    f"{track_header}\n\n"
+                    f"🔄 Preparing high-quality download...",
                     parse_mode='Markdown'
                 )
-                # Clean up file
-                os.remove(downloaded_file)
-                return
-            
-            # Update message
-            await processing_msg.edit_text(
-                "📤 **Almost Ready!**\n"
-                "Finalizing your premium MP3 file...",
-                parse_mode='Markdown'
-            )
-            
-            # Generate clean filename
-            clean_name = clean_filename(f"{', '.join(track_info['artists'])} - {track_info['name']}")
-            
-            # Send audio file
-            with open(downloaded_file, 'rb') as audio_file:
+                
+                # Re-send a previously uploaded track; if Telegram no longer accepts the
+                # file_id, forget it and fall back to downloading the track again
+                sent = None
+                if file_id and update.message:
+                    try:
+                        sent = await self._send_audio(update, file_id, None, track_info)
+                    except BadRequest as e:
+                        logger.warning("Cached file_id for %s rejected, downloading again: %s", track_id, e)
+                        self._audio_cache.pop(track_id, None)
+                        file_id = None
+                        shared = self._join_download(search_query, track_info)
+                
+                if not file_id:
+                    downloaded_file, error = await asyncio.shield(shared.task)
+                    
+                    if error or not downloaded_file:
+                        await progress.update(
+                            f"❌ **Download Failed**\n\n"
+                            f"{error or 'Unable to process this track at the moment.'}\n"
+                            f"Please try again with a different Spotify link.",
+                            final=True,
+                            parse_mode='Markdown'
+                        )
+                        return
+                    
+                    # Check the size and read the file in a single worker-thread hop
+                    file_size, audio_data = await self._run_blocking(
+                        read_audio_file, downloaded_file, Config.MAX_FILE_SIZE
+                    )
+                    if audio_data is None:
+                        await progress.update(
+                            f"❌ **File Too Large**\n\n"
+                            f"This track ({format_file_size(file_size)}) exceeds Telegram's 50MB limit.\n"
+                            f"Please try a shorter track or different version.",
+                            final=True,
+                            parse_mode='Markdown'
+                        )
+                        return
+                    
+                    # Generate clean filename
+                    clean_name = clean_filename(f"{track_info['artists_str']} - {track_info['name']}")
+                    
+                    # Send audio file
+                    if update.message:
+                        sent = await self._send_audio(update, audio_data, f"{clean_name}.mp3", track_info)
+                
+                if sent and sent.audio:
+                    self._cache_audio(track_id, sent.audio.file_id)
+                
+                # Delete processing message, dropping any status edit still pending
+                progress.cancel()
+                await processing_msg.delete()
+                
+                # Send success message with action buttons
                 if update.message:
-                    await update.message.reply_audio(
-                        audio=audio_file,
-                        filename=f"{clean_name}.mp3",
-                        title=track_info['name'],
-                        performer=', '.join(track_info['artists']),
-                        duration=track_info.get('duration_ms', 0) // 1000
+                    await update.message.reply_text(
+                        f"🎉 **Download Complete!**\n\n"
+                        f"{track_header}\n\n"
+                        f"✨ Enjoy your premium quality MP3!\n"
+                        f"💝 Thank you for using SpotifyDL Pro",
+                        reply_markup=SUCCESS_MARKUP,
+                        parse_mode='Markdown'
                     )
-            
-            # Delete processing message
-            await processing_msg.delete()
-            
-            # Send success message with action buttons
-            success_keyboard = [
-                [InlineKeyboardButton("🎵 Download Another", callback_data='start')],
-                [InlineKeyboardButton("⭐ Rate SpotifyDL", callback_data='rate'),
-                 InlineKeyboardButton("📢 Share Bot", callback_data='share')]
-            ]
-            success_markup = InlineKeyboardMarkup(success_keyboard)
-            
-            if update.message:
-                await update.message.reply_text(
-                    f"🎉 **Download Complete!**\n\n"
-                    f"🎵 **{track_info['name']}**\n"
-                    f"👤 **{', '.join(track_info['artists'])}**\n"
-                    f"💿 **{track_info['album']}**\n\n"
-                    f"✨ Enjoy your premium quality MP3!\n"
-                    f"💝 Thank you for using SpotifyDL Pro",
-                    reply_markup=success_markup,
+                
+            except Exception as e:
+                logger.error("Error processing message: %s", e)
+                await progress.update(
+                    SERVICE_ISSUE_MESSAGE,
+                    final=True,
                     parse_mode='Markdown'
                 )
             
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            await processing_msg.edit_text(
-                "❌ **Temporary Service Issue**\n\n"
-                "We're experiencing high demand right now.\n"
-                "Please try again in a few moments!",
-                parse_mode='Markdown'
-            )
+            finally:
+                # Release the download; the file is removed once no request needs it
+                try:
+                    if shared:
+                        await self._leave_download(search_query, shared)
+                except Exception as e:
+                    logger.error("Error cleaning up file: %s", e)
+    
+    async def _send_audio(self, update, audio, filename, track_info):
+        """Reply with a track, given as bytes or a Telegram file_id."""
+        return await update.message.reply_audio(
+            audio=audio,
+            filename=filename,
+            title=track_info['name'],
+            performer=track_info['artists_str'],
+            duration=track_info.get('duration_ms', 0) // 1000
+        )
+    
+    async def _run_blocking(self, func, *args):
+        """Run a blocking call in the I/O thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_pool, func, *args)
+    
+    def _get_cached_audio(self, track_id):
+        """Return the Telegram file_id of a previously sent track."""
+        file_id = self._audio_cache.get(track_id)
+        if file_id:
+            self._audio_cache.move_to_end(track_id)
+        return file_id
+    
+    def _cache_audio(self, track_id, file_id):
+        """Remember a track's Telegram file_id, evicting the oldest entries."""
+        self._audio_cache[track_id] = file_id
+        self._audio_cache.move_to_end(track_id)
+        while len(self._audio_cache) > AUDIO_CACHE_SIZE:
+            self._audio_cache.popitem(last=False)
+    
+    def _get_chat_lock(self, chat_id):
+        """Return the lock serializing downloads for a chat."""
+        lock = self._chat_locks.get(chat_id)
+        if not lock:
+            lock = self._chat_locks[chat_id] = asyncio.Lock()
+        return lock
+    
+    def _join_download(self, search_query, track_info):
+        """Start a track download or join the one already running for it."""
+        shared = self._downloads.get(search_query)
+        if not shared:
+            task = asyncio.ensure_future(self._download(search_query, track_info))
+            shared = self._downloads[search_query] = SharedDownload(task)
+        shared.users += 1
+        return shared
+    
+    async def _leave_download(self, search_query, shared):
+        """Release a shared download, deleting its file after the last user."""
+        shared.users -= 1
+        if shared.users:
+            return
         
-        finally:
-            # Clean up downloaded file
+        if self._downloads.get(search_query) is shared:
+            del self._downloads[search_query]
+        
+        if not shared.task.done():
+            shared.task.cancel()
+            return
+        if shared.task.cancelled() or shared.task.exception():
+            return
+        
+        downloaded_file, _ = shared.task.result()
+        if downloaded_file:
+            await self._run_blocking(remove_file, downloaded_file)
+    
+    async def _sweep_temp_dir(self):
+        """Periodically delete downloads abandoned by crashed or interrupted requests."""
+        while True:
             try:
-                if downloaded_file and os.path.exists(downloaded_file):
-                    os.remove(downloaded_file)
+                removed = await self._run_blocking(
+                    remove_stale_files, Config.TEMP_DIR, Config.TEMP_FILE_MAX_AGE
+                )
+                if removed:
+                    logger.info("Removed %d stale files from %s", removed, Config.TEMP_DIR)
             except Exception as e:
-                logger.error(f"Error cleaning up file: {e}")
+                logger.error("Error sweeping temp directory: %s", e)
+            await asyncio.sleep(Config.TEMP_SWEEP_INTERVAL)
+    
+    def _new_download_pool(self):
+        """Create the process pool that runs yt-dlp downloads."""
+        return ProcessPoolExecutor(
+            max_workers=Config.DOWNLOAD_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    
+    async def _download(self, search_query, track_info):
+        """Search for and download a track in the download process pool."""
+        loop = asyncio.get_running_loop()
+        pool = self._download_pool
+        try:
+            return await loop.run_in_executor(pool, download_track, search_query, track_info)
+        except BrokenProcessPool:
+            # A crashed or killed worker breaks the whole pool; replace it so later
+            # requests work again (concurrent failures share one replacement)
+            logger.error("Download worker died, restarting the download pool")
+            if self._download_pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._download_pool = self._new_download_pool()
+            return None, "Download failed unexpectedly, please try again"
     
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle button clicks."""
@@ -251,186 +610,41 @@ Just paste any Spotify track link and watch the magic happen!
             logger.error("No callback query found in update")
             return
         
-        logger.info(f"Button clicked: {query.data}")
+        logger.info("Button clicked: %s", query.data)
         
         try:
             await query.answer()
         except Exception as e:
-            logger.error(f"Error answering callback query: {e}")
+            logger.error("Error answering callback query: %s", e)
             return
         
-        if query.data == 'help':
-            # Create a modified update object for help command
-            help_message = """🎯 **SpotifyDL Pro - Quick Guide**
-
-**Step 1: Find Your Song** 🔍
-• Open Spotify (app or web)
-• Navigate to any track you love
-• Tap the share button (•••)
-• Copy the link
-
-**Step 2: Send to SpotifyDL** 📱
-• Paste the Spotify link here
-• Our AI instantly recognizes the track
-• Sit back and relax!
-
-**Step 3: Enjoy Your Music** 🎧
-• Receive high-quality MP3 in seconds
-• Complete with artist, title & album info
-• Ready to play anywhere, anytime
-
-**Supported Links:**
-✅ `https://open.spotify.com/track/...`
-✅ `https://spotify.com/track/...`  
-✅ `spotify:track:...`
-
-**Features:**
-🎵 192kbps premium quality
-📱 Works with any Spotify track
-⚡ Lightning-fast processing
-🎯 100% accurate track matching
-📦 Up to 50MB file size
-
-**Ready to download?** Just paste a Spotify link below! 👇"""
-            
-            keyboard = [
-                [InlineKeyboardButton("🏠 Back to Home", callback_data='start'),
-                 InlineKeyboardButton("🎵 Try Now", callback_data='demo')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            try:
-                await query.edit_message_text(
-                    help_message,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-            except Exception as e:
-                logger.error(f"Error editing message for help: {e}")
-        elif query.data == 'demo':
-            # Rotating demo songs - popular hits
-            demo_songs = [
-                ("Billie Eilish - BIRDS OF A FEATHER", "https://open.spotify.com/track/6dOtVTDdiauQNBQEDOtlAB"),
-                ("Sabrina Carpenter - Espresso", "https://open.spotify.com/track/2qSkIjg1o9h3YT9RAgYN75"),
-                ("Lady Gaga & Bruno Mars - Die With A Smile", "https://open.spotify.com/track/2plbrEY59IikOBgBGLjaoe"),
-                ("The Weeknd - Blinding Lights", "https://open.spotify.com/track/0VjIjW4GlUZAMYd2vXMi3b"),
-                ("Harry Styles - As It Was", "https://open.spotify.com/track/4LRPiXqCikLlN15c3yImP7"),
-                ("Wiz Khalifa - See You Again (feat. Charlie Puth)", "https://open.spotify.com/track/6UVjo42dT0yQXX0ogxeR9s"),
-            ]
-            
-            # Select random song
-            import random
-            selected_song, selected_url = random.choice(demo_songs)
-            
-            demo_text = f"""🎵 **Try with this demo Spotify link:**
-
-*{selected_song}*
-`{selected_url}`
-
-Just copy and paste the link above to see SpotifyDL Pro in action! 🚀"""
-            
-            keyboard = [
-                [InlineKeyboardButton("🏠 Back to Home", callback_data='start')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            try:
-                await query.edit_message_text(
-                    demo_text,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-            except Exception as e:
-                logger.error(f"Error editing message for demo: {e}")
-        elif query.data == 'rate':
-            rate_text = """⭐ **Rate SpotifyDL Pro**
-
-Thank you for using our service! Your feedback helps us improve.
-
-Please rate us on:
-• Speed of download
-• Audio quality  
-• User experience
-• Overall satisfaction
-
-Share your experience with friends and family! 💝"""
-            
-            keyboard = [
-                [InlineKeyboardButton("📢 Share Bot", callback_data='share')],
-                [InlineKeyboardButton("🏠 Back to Home", callback_data='start')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            try:
-                await query.edit_message_text(
-                    rate_text,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-            except Exception as e:
-                logger.error(f"Error editing message for rate: {e}")
-        elif query.data == 'share':
-            share_text = """📢 **Share SpotifyDL Pro**
-
-Love our service? Spread the word!
-
-📱 **Share this bot with friends:**
-`@SAN_Filebot (SpotifyDLProBot)`
-
-💬 **Tell them about:**
-• Lightning-fast downloads
-• Premium audio quality
-• Zero registration required
-• 100% free to use
-
-Thank you for helping us grow! 🚀"""
-            
-            keyboard = [
-                [InlineKeyboardButton("⭐ Rate Us", callback_data='rate')],
-                [InlineKeyboardButton("🏠 Back to Home", callback_data='start')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            try:
-                await query.edit_message_text(
-                    share_text,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-            except Exception as e:
-                logger.error(f"Error editing message for share: {e}")
-        elif query.data == 'start':
-            # Recreate start message for callback
-            welcome_message = """🎵 **Welcome to SpotifyDL Pro** 🎵
-
-Transform your Spotify discoveries into high-quality MP3 files instantly!
-
-✨ **What makes us special:**
-• Lightning-fast downloads in seconds
-• Crystal-clear 192kbps audio quality  
-• Smart track recognition technology
-• Automatic metadata tagging
-• Zero registration required
-
-🎯 **How it works:**
-Just paste any Spotify track link and watch the magic happen!
-
-🚀 **Ready to get started?**"""
-            
-            # Create attractive buttons
-            keyboard = [
-                [InlineKeyboardButton("📖 How to Use", callback_data='help'),
-                 InlineKeyboardButton("🎵 Try Demo", callback_data='demo')],
-                [InlineKeyboardButton("⭐ Rate Us", callback_data='rate'),
-                 InlineKeyboardButton("📢 Share Bot", callback_data='share')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            try:
-                await query.edit_message_text(
-                    welcome_message,
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-            except Exception as e:
-                logger.error(f"Error editing message for start: {e}")
+        screen = STATIC_SCREENS.get(query.data)
+        if screen:
+            await self._show_screen(query, screen)
+            return
+        
+        handler = self._callback_handlers.get(query.data)
+        if handler:
+            await handler(query)
+    
+    @log_callback_errors
+    async def _show_screen(self, query, screen):
+        """Show one of the static screens."""
+        text, markup = screen
+        await query.edit_message_text(
+            text,
+            reply_markup=markup,
+            parse_mode='Markdown'
+        )
+    
+    @log_callback_errors
+    async def _show_demo(self, query):
+        """Show a random demo Spotify link."""
+        # Select random song
+        selected_song, selected_url = random.choice(DEMO_SONGS)
+        
+        await query.edit_message_text(
+            DEMO_TEXT_TEMPLATE.format(song=selected_song, url=selected_url),
+            reply_markup=DEMO_MARKUP,
+            parse_mode='Markdown'
+        )
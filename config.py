@@ -3,6 +3,7 @@ Configuration settings for the Telegram bot.
 """
 
 import os
+from types import MappingProxyType
 
 class Config:
     """Configuration class for bot settings."""
@@ -14,22 +15,37 @@ class Config:
     SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID', 'your_spotify_client_id')
     SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET', 'your_spotify_client_secret')
     
+    # Webhook settings (polling is used when WEBHOOK_URL is not set)
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # public HTTPS base URL, e.g. https://bot.example.com
+    WEBHOOK_PORT = int(os.getenv('PORT', 8443))
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+    
     # File settings
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB max file size for Telegram
     TEMP_DIR = '/tmp/telegram_bot_downloads'
+    TEMP_FILE_MAX_AGE = int(os.getenv('TEMP_FILE_MAX_AGE', 3600))  # seconds before leftovers are deleted
+    TEMP_SWEEP_INTERVAL = int(os.getenv('TEMP_SWEEP_INTERVAL', 900))  # seconds between sweeps
+    
+    # Download settings
+    # Parallel yt-dlp processes; kept small since many downloads from one IP get throttled by YouTube
+    DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', min(os.cpu_count() or 1, 3)))
+    IO_WORKERS = int(os.getenv('IO_WORKERS', 8))  # threads for blocking Spotify/file calls
+    
+    # Spotify metadata cache (track metadata rarely changes)
+    TRACK_CACHE_SIZE = int(os.getenv('TRACK_CACHE_SIZE', 2048))
+    TRACK_CACHE_TTL = int(os.getenv('TRACK_CACHE_TTL', 3600))  # seconds
+    
+    # YouTube search result cache, per download worker
+    SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 256))
+    SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 3600))  # seconds
     
     # Audio settings
     AUDIO_FORMAT = 'mp3'
     AUDIO_QUALITY = '192'  # kbps
     
-    # YouTube-DL settings
-    YT_DLP_OPTIONS = {
-        'format': 'bestaudio/best',
-        'extractaudio': True,
-        'audioformat': AUDIO_FORMAT,
-        'audioquality': AUDIO_QUALITY,
-        'outtmpl': f'{TEMP_DIR}/%(title)s.%(ext)s',
+    # yt-dlp options shared by searches and downloads (read-only so it can be shared safely between calls)
+    YT_DLP_OPTIONS = MappingProxyType({
         'noplaylist': True,
         'quiet': True,
         'no_warnings': True,
-    }
+    })
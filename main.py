@@ -3,12 +3,20 @@
 Telegram bot that downloads YouTube audio from Spotify song links.
 """
 
+import asyncio
 import logging
 import os
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram.error import TelegramError
+from telegram.ext import AIORateLimiter, Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram.request import HTTPXRequest
 from config import Config
 from bot_handlers import BotHandlers
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -16,14 +24,51 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def install_uvloop():
+    """Use uvloop's event loop when it is available."""
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.info("Using uvloop event loop")
+
+class OrjsonRequest(HTTPXRequest):
+    """HTTPXRequest that parses Bot API responses with orjson."""
+    
+    @staticmethod
+    def parse_json_payload(payload):
+        """Parse a response body straight from bytes."""
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError as exc:
+            raise TelegramError("Invalid server response") from exc
+
 def main():
     """Start the bot."""
-    # Create the Application
-    application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
+    install_uvloop()
     
     # Initialize bot handlers
     bot_handlers = BotHandlers()
     
+    # Create the Application
+    builder = (
+        Application.builder()
+        .token(Config.TELEGRAM_BOT_TOKEN)
+        # Keep outgoing calls within Telegram's flood limits and retry on RetryAfter
+        .rate_limiter(AIORateLimiter(max_retries=3))
+        .post_init(bot_handlers.post_init)
+        .post_shutdown(bot_handlers.shutdown)
+    )
+    if orjson:
+        # Same pool sizes as PTB's defaults, with faster JSON decoding
+        builder = (
+            builder
+            .request(OrjsonRequest(connection_pool_size=256))
+            .get_updates_request(OrjsonRequest())
+        )
+    application = builder.build()
+    
     # Register handlers
     application.add_handler(CommandHandler("start", bot_handlers.start))
     application.add_handler(CommandHandler("help", bot_handlers.help_command))
@@ -31,8 +76,21 @@ def main():
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot_handlers.handle_message))
     
     # Start the bot
-    logger.info("Starting Telegram bot...")
-    application.run_polling(allowed_updates=["message", "callback_query"])
+    allowed_updates = ["message", "callback_query"]
+    if Config.WEBHOOK_URL:
+        # Telegram pushes updates to us instead of waiting on long-poll round-trips
+        logger.info("Starting Telegram bot with webhook...")
+        application.run_webhook(
+            listen='0.0.0.0',
+            port=Config.WEBHOOK_PORT,
+            url_path='webhook',
+            webhook_url=f"{Config.WEBHOOK_URL.rstrip('/')}/webhook",
+            secret_token=Config.WEBHOOK_SECRET,
+            allowed_updates=allowed_updates
+        )
+    else:
+        logger.info("Starting Telegram bot...")
+        application.run_polling(allowed_updates=allowed_updates)
 
 if __name__ == '__main__':
     main()
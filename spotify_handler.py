@@ -3,53 +3,138 @@ Spotify API handler for extracting song metadata.
 """
 
 import re
+import time
+import functools
+import threading
+import requests
+import urllib3
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
+from collections import OrderedDict
 from config import Config
 import logging
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Supported Spotify track link formats as a single alternation, compiled once
+SPOTIFY_TRACK_RE = re.compile(
+    r'(?:https://(?:open\.)?spotify\.com/track/|spotify:track:)([a-zA-Z0-9]+)'
+)
+
+# Rate-limit handling: waits longer than this are not worth holding a request for
+SPOTIFY_RATE_LIMIT_RETRIES = 3
+SPOTIFY_MAX_RETRY_AFTER = 10  # seconds
+
+def retry_on_rate_limit(func):
+    """Retry a Spotify call after a 429 response, honouring Retry-After."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(SPOTIFY_RATE_LIMIT_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except spotipy.SpotifyException as e:
+                # spotipy also reports exhausted 5xx retries as a 429 ("Max Retries"),
+                # but without headers; only a genuine rate limit carries Retry-After
+                headers = e.headers or {}
+                if e.http_status != 429 or 'Retry-After' not in headers:
+                    raise
+                try:
+                    delay = int(headers['Retry-After'])
+                except ValueError:
+                    delay = 2 ** attempt
+                if delay > SPOTIFY_MAX_RETRY_AFTER:
+                    raise
+                logger.warning("Spotify rate limited, retrying in %ss", delay)
+                time.sleep(delay)
+        return func(*args, **kwargs)
+    return wrapper
+
+def _use_orjson(response, *args, **kwargs):
+    """Response hook making response.json() parse with orjson."""
+    # orjson.JSONDecodeError subclasses ValueError, which spotipy already handles
+    response.json = lambda **kw: orjson.loads(response.content)
+    return response
+
 class SpotifyHandler:
     """Handles Spotify API operations."""
     
     def __init__(self):
         """Initialize Spotify client."""
+        # One keep-alive session for both token refreshes and API calls
+        self.session = self._build_session()
+        
+        # LRU cache of track_id -> (expires_at, track_info)
+        self._track_cache = OrderedDict()
+        self._track_cache_lock = threading.Lock()
         try:
             client_credentials_manager = SpotifyClientCredentials(
                 client_id=Config.SPOTIFY_CLIENT_ID,
-                client_secret=Config.SPOTIFY_CLIENT_SECRET
+                client_secret=Config.SPOTIFY_CLIENT_SECRET,
+                requests_session=self.session
+            )
+            self.sp = spotipy.Spotify(
+                client_credentials_manager=client_credentials_manager,
+                requests_session=self.session
             )
-            self.sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
         except Exception as e:
-            logger.error(f"Failed to initialize Spotify client: {e}")
+            logger.error("Failed to initialize Spotify client: %s", e)
             self.sp = None
+            return
+        
+        # Fetch the client-credentials token up front; spotipy keeps it in memory
+        # and only refreshes it when it is about to expire
+        try:
+            client_credentials_manager.get_access_token(as_dict=False)
+        except Exception as e:
+            logger.warning("Could not prefetch Spotify token: %s", e)
+    
+    def _build_session(self):
+        """Create a pooled HTTP session retrying transient server errors."""
+        session = requests.Session()
+        retry = urllib3.Retry(
+            total=3,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+            status=3,
+            backoff_factor=0.3,
+            status_forcelist=(500, 502, 503, 504),
+            # 429s are left to retry_on_rate_limit, which caps how long it waits;
+            # urllib3 would otherwise sleep for any Retry-After the response carries
+            respect_retry_after_header=False
+        )
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=20, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if orjson is not None:
+            session.hooks['response'].append(_use_orjson)
+        return session
+    
+    def close(self):
+        """Close pooled HTTP connections."""
+        self.session.close()
     
     def is_spotify_url(self, url):
         """Check if the URL is a valid Spotify track URL."""
-        spotify_patterns = [
-            r'https://open\.spotify\.com/track/([a-zA-Z0-9]+)',
-            r'https://spotify\.com/track/([a-zA-Z0-9]+)',
-            r'spotify:track:([a-zA-Z0-9]+)'
-        ]
+        # Cheap substring check rejects ordinary chat text before any regex runs
+        if 'spotify' not in url:
+            return False
         
-        for pattern in spotify_patterns:
-            if re.match(pattern, url):
-                return True
-        return False
+        return SPOTIFY_TRACK_RE.match(url) is not None
     
     def extract_track_id(self, url):
         """Extract Spotify track ID from URL."""
-        patterns = [
-            r'https://open\.spotify\.com/track/([a-zA-Z0-9]+)',
-            r'https://spotify\.com/track/([a-zA-Z0-9]+)',
-            r'spotify:track:([a-zA-Z0-9]+)'
-        ]
+        if 'spotify' not in url:
+            return None
         
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
+        match = SPOTIFY_TRACK_RE.match(url)
+        if match:
+            return match.group(1)
         return None
     
     def get_track_info(self, track_id):
@@ -57,47 +142,82 @@ class SpotifyHandler:
         if not self.sp:
             return None
         
+        cached = self._get_cached_track(track_id)
+        if cached:
+            return cached
+        
         try:
-            track = self.sp.track(track_id)
+            track = self._fetch_track(track_id)
             
             if not track:
                 return None
             
-            # Extract relevant information
+            # Extract relevant information; Spotify may send null for nested objects
+            album = track.get('album') or {}
+            artists = [artist.get('name', '') for artist in track.get('artists') or ()]
             track_info = {
                 'name': track.get('name', ''),
-                'artists': [artist.get('name', '') for artist in track.get('artists', [])],
-                'album': track.get('album', {}).get('name', ''),
+                'artists': artists,
+                'artists_str': ', '.join(artists),
+                'artists_joined': ' '.join(artists),
+                'album': album.get('name', ''),
                 'duration_ms': track.get('duration_ms', 0),
                 'popularity': track.get('popularity', 0),
                 'preview_url': track.get('preview_url'),
-                'external_urls': track.get('external_urls', {})
+                'external_urls': track.get('external_urls') or {}
             }
             
+            self._cache_track(track_id, track_info)
             return track_info
             
         except Exception as e:
-            logger.error(f"Error fetching track info: {e}")
+            logger.error("Error fetching track info: %s", e)
             return None
     
+    @retry_on_rate_limit
+    def _fetch_track(self, track_id):
+        """Fetch a raw track object from the Spotify API."""
+        return self.sp.track(track_id)
+    
+    def _get_cached_track(self, track_id):
+        """Return cached track info if present and not expired."""
+        with self._track_cache_lock:
+            entry = self._track_cache.get(track_id)
+            if not entry:
+                return None
+            
+            expires_at, track_info = entry
+            if expires_at < time.monotonic():
+                del self._track_cache[track_id]
+                return None
+            
+            self._track_cache.move_to_end(track_id)
+            return track_info
+    
+    def _cache_track(self, track_id, track_info):
+        """Store track info, evicting the least recently used entries."""
+        with self._track_cache_lock:
+            self._track_cache[track_id] = (time.monotonic() + Config.TRACK_CACHE_TTL, track_info)
+            self._track_cache.move_to_end(track_id)
+            while len(self._track_cache) > Config.TRACK_CACHE_SIZE:
+                self._track_cache.popitem(last=False)
+    
     def get_search_query(self, track_info):
         """Generate search query from track info."""
         if not track_info:
             return None
         
-        artists = ' '.join(track_info['artists'])
-        query = f"{artists} - {track_info['name']}"
+        query = f"{track_info['artists_joined']} - {track_info['name']}"
         
         return query
     
     def process_spotify_url(self, url):
         """Process Spotify URL and return track information."""
-        if not self.is_spotify_url(url):
-            return None
-        
-        track_id = self.extract_track_id(url)
-        if not track_id:
+        # One match both validates the link and captures the track ID
+        match = SPOTIFY_TRACK_RE.match(url)
+        if not match:
             return None
+        track_id = match.group(1)
         
         track_info = self.get_track_info(track_id)
         if not track_info:
@@ -106,6 +226,7 @@ class SpotifyHandler:
         search_query = self.get_search_query(track_info)
         
         return {
+            'track_id': track_id,
             'track_info': track_info,
             'search_query': search_query
         }
@@ -4,13 +4,28 @@ Utility functions for the Telegram bot.
 
 import re
 import os
+import time
+
+# Audio file extensions accepted for upload
+AUDIO_EXTENSIONS = frozenset(['.mp3', '.m4a', '.ogg', '.webm'])
+
+# Drops characters invalid in filenames (including control characters) and
+# turns line breaks/tabs into spaces
+FILENAME_TRANSLATION = str.maketrans({
+    **{chr(c): None for c in [*range(0x20), 0x7f]},
+    **{c: None for c in '<>:"/\\|?*'},
+    **{c: ' ' for c in '\r\n\t'},
+})
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Characters that interfere with search
+SEARCH_QUERY_JUNK_RE = re.compile(r'[^\w\s\-&]')
 
 def clean_filename(filename):
     """Clean filename to be safe for file systems."""
     # Remove or replace invalid characters
-    filename = re.sub(r'[<>:"/\\|?*]', '', filename)
-    filename = re.sub(r'[\r\n\t]', ' ', filename)
-    filename = re.sub(r'\s+', ' ', filename).strip()
+    filename = filename.translate(FILENAME_TRANSLATION)
+    filename = WHITESPACE_RE.sub(' ', filename).strip()
     
     # Limit length
     if len(filename) > 100:
@@ -34,23 +49,59 @@ def format_file_size(size_bytes):
 
 def is_valid_audio_file(filepath):
     """Check if file is a valid audio file."""
-    if not os.path.exists(filepath):
+    # A single stat covers both existence and size
+    try:
+        size = os.stat(filepath).st_size
+    except OSError:
         return False
     
-    # Check file size
-    if os.path.getsize(filepath) == 0:
+    if size == 0:
         return False
     
     # Check extension
-    valid_extensions = ['.mp3', '.m4a', '.ogg', '.webm']
     file_ext = os.path.splitext(filepath)[1].lower()
     
-    return file_ext in valid_extensions
+    return file_ext in AUDIO_EXTENSIONS
+
+def read_audio_file(filepath, max_size):
+    """Return (size, data) for a file, with data None if it exceeds max_size."""
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size > max_size:
+            return size, None
+        return size, f.read()
+
+def remove_file(filepath):
+    """Delete a file if it exists."""
+    try:
+        os.unlink(filepath)
+    except FileNotFoundError:
+        pass
+
+def remove_stale_files(directory, max_age):
+    """Delete regular files in directory not modified for max_age seconds; return the count."""
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return 0
+    
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    
+    return removed
 
 def sanitize_search_query(query):
     """Sanitize search query for processing."""
     # Remove special characters that might interfere with search
-    query = re.sub(r'[^\w\s\-&]', '', query)
-    query = re.sub(r'\s+', ' ', query).strip()
+    query = SEARCH_QUERY_JUNK_RE.sub('', query)
+    query = WHITESPACE_RE.sub(' ', query).strip()
     
     return query
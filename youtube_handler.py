@@ -3,141 +3,230 @@ YouTube handler for searching and downloading audio.
 """
 
 import os
-import yt_dlp
-import tempfile
+import re
+import glob
+import time
+import uuid
+from types import MappingProxyType
+from collections import OrderedDict
+from rapidfuzz import fuzz, utils as fuzz_utils
 from config import Config
+from utils import remove_file
 import logging
 
 logger = logging.getLogger(__name__)
 
+# yt-dlp is heavy to import and only needed inside download workers
+_yt_dlp = None
+
+def _load_yt_dlp():
+    """Import yt-dlp on first use."""
+    global _yt_dlp
+    if _yt_dlp is None:
+        import yt_dlp
+        _yt_dlp = yt_dlp
+    return _yt_dlp
+
+# Invariant yt-dlp options, built once. YoutubeDL fills defaults into the dict it
+# is given, so each instance gets its own copy.
+SEARCH_OPTIONS = MappingProxyType({
+    **Config.YT_DLP_OPTIONS,
+    'default_search': 'ytsearch5:',  # Search for top 5 results
+    'extract_flat': 'in_playlist',  # Titles/durations come with the results page; skip per-video lookups
+})
+
+DOWNLOAD_OPTIONS = MappingProxyType({
+    **Config.YT_DLP_OPTIONS,
+    'format': 'bestaudio/best',
+    'postprocessors': [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': Config.AUDIO_FORMAT,
+        'preferredquality': Config.AUDIO_QUALITY,
+    }],
+    'concurrent_fragment_downloads': 4,  # fetch segmented (HLS/DASH) formats in parallel
+    'http_chunk_size': 10 << 20,  # ranged 10MB requests avoid YouTube's per-connection throttling
+    'retries': 5,
+    'fragment_retries': 5,
+})
+
+# Download attempts when YouTube throttles or refuses a request
+DOWNLOAD_ATTEMPTS = 3
+RETRYABLE_DOWNLOAD_ERRORS = ('HTTP Error 429', 'HTTP Error 403')
+
+# Minimum title similarity (0-100) for a result to be considered at all
+MIN_TITLE_SIMILARITY = 40
+
+# Results whose length differs from the track by more than this are not scored
+MAX_DURATION_DIFF = 60  # seconds
+
 class YouTubeHandler:
     """Handles YouTube operations."""
     
+    # Title keywords that raise or lower a search result's score
+    _BOOST_RE = re.compile(r'\b(?:official|music video|audio)\b', re.IGNORECASE)
+    _PENALTY_RE = re.compile(r'\b(?:live|cover|remix|karaoke)\b', re.IGNORECASE)
+    
     def __init__(self):
         """Initialize YouTube handler."""
         # Ensure temp directory exists
         os.makedirs(Config.TEMP_DIR, exist_ok=True)
+        
+        # YoutubeDL instances by options set; building one loads every extractor
+        self._ydl_cache = {}
+        
+        # LRU cache of (query, max_results) -> (expires_at, results)
+        self._search_cache = OrderedDict()
+    
+    def _get_ydl(self, name, options):
+        """Return the YoutubeDL instance for an options set, creating it on first use."""
+        ydl = self._ydl_cache.get(name)
+        if ydl is None:
+            ydl = _load_yt_dlp().YoutubeDL(dict(options))
+            self._ydl_cache[name] = ydl
+        return ydl
     
     def search_youtube(self, query, max_results=5):
         """Search for videos on YouTube."""
+        key = (query, max_results)
+        cached = self._get_cached_search(key)
+        if cached:
+            return cached
+        
         try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'default_search': 'ytsearch5:',  # Search for top 5 results
-            }
+            ydl = self._get_ydl('search', SEARCH_OPTIONS)
+            search_results = ydl.extract_info(query, download=False)
+            
+            if not search_results or 'entries' not in search_results:
+                return []
+            
+            entries = search_results.get('entries', [])
+            results = [
+                {
+                    'id': entry.get('id'),
+                    'title': entry.get('title'),
+                    'duration': entry.get('duration'),
+                    'url': entry.get('webpage_url') or entry.get('url'),
+                    'uploader': entry.get('uploader') or entry.get('channel')
+                }
+                for entry in entries[:max_results] if entry
+            ]
+            
+            if results:
+                self._cache_search(key, results)
+            return results
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                search_results = ydl.extract_info(query, download=False)
-                
-                if not search_results or 'entries' not in search_results:
-                    return []
-                
-                results = []
-                entries = search_results.get('entries', [])
-                for entry in entries[:max_results]:
-                    if entry:
-                        results.append({
-                            'id': entry.get('id'),
-                            'title': entry.get('title'),
-                            'duration': entry.get('duration'),
-                            'url': entry.get('webpage_url'),
-                            'uploader': entry.get('uploader')
-                        })
-                
-                return results
-                
         except Exception as e:
-            logger.error(f"Error searching for track: {e}")
+            logger.error("Error searching for track: %s", e)
             return []
     
+    def _get_cached_search(self, key):
+        """Return cached search results if present and not expired."""
+        entry = self._search_cache.get(key)
+        if not entry:
+            return None
+        
+        expires_at, results = entry
+        if expires_at < time.monotonic():
+            del self._search_cache[key]
+            return None
+        
+        self._search_cache.move_to_end(key)
+        return results
+    
+    def _cache_search(self, key, results):
+        """Store search results, evicting the least recently used entries."""
+        self._search_cache[key] = (time.monotonic() + Config.SEARCH_CACHE_TTL, results)
+        self._search_cache.move_to_end(key)
+        while len(self._search_cache) > Config.SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+    
     def download_audio(self, video_url, filename=None):
         """Download audio from YouTube video."""
         try:
-            # Create a unique temporary filename
+            # Create a unique temporary filename; yt-dlp creates the file itself
             if not filename:
-                temp_file = tempfile.NamedTemporaryFile(
-                    suffix=f'.{Config.AUDIO_FORMAT}',
-                    dir=Config.TEMP_DIR,
-                    delete=False
-                )
-                filename = temp_file.name
-                temp_file.close()
-            
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': filename.replace(f'.{Config.AUDIO_FORMAT}', '.%(ext)s'),
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': Config.AUDIO_FORMAT,
-                    'preferredquality': Config.AUDIO_QUALITY,
-                }],
-                'quiet': True,
-                'no_warnings': True,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
+                filename = os.path.join(Config.TEMP_DIR, f"{uuid.uuid4().hex}.{Config.AUDIO_FORMAT}")
             
-            # Find the actual downloaded file
-            expected_filename = filename
-            if os.path.exists(expected_filename):
-                return expected_filename
+            # Worker processes run one download at a time, so the shared instance
+            # can take this call's output template directly
+            ydl = self._get_ydl('download', DOWNLOAD_OPTIONS)
+            ydl.params['outtmpl']['default'] = filename.replace(f'.{Config.AUDIO_FORMAT}', '.%(ext)s')
+            info = self._download_with_retry(ydl, video_url)
             
-            # Sometimes the extension might be different
-            base_name = filename.replace(f'.{Config.AUDIO_FORMAT}', '')
-            for ext in ['mp3', 'm4a', 'webm', 'ogg']:
-                test_file = f"{base_name}.{ext}"
-                if os.path.exists(test_file):
-                    return test_file
-            
-            return None
+            # yt-dlp reports the final path after post-processing
+            downloads = (info or {}).get('requested_downloads') or []
+            if downloads:
+                return downloads[0].get('filepath')
             
         except Exception as e:
-            logger.error(f"Error downloading audio: {e}")
-            return None
+            logger.error("Error downloading audio: %s", e)
+        
+        # Drop partial output (.part fragments, unconverted source audio)
+        self._remove_partial_files(filename)
+        return None
+    
+    def _remove_partial_files(self, filename):
+        """Delete every file sharing the download's base name."""
+        base_name = os.path.splitext(filename)[0]
+        for path in glob.glob(f"{glob.escape(base_name)}.*"):
+            remove_file(path)
+    
+    def _download_with_retry(self, ydl, video_url):
+        """Download a video, backing off when YouTube rate limits the worker."""
+        for attempt in range(DOWNLOAD_ATTEMPTS):
+            try:
+                return ydl.extract_info(video_url, download=True)
+            except _load_yt_dlp().utils.DownloadError as e:
+                retryable = any(code in str(e) for code in RETRYABLE_DOWNLOAD_ERRORS)
+                if not retryable or attempt == DOWNLOAD_ATTEMPTS - 1:
+                    raise
+                delay = 2 ** attempt
+                logger.warning("Download throttled, retrying in %ss: %s", delay, e)
+                time.sleep(delay)
     
     def get_best_match(self, search_results, track_info):
         """Find the best matching video from search results."""
         if not search_results or not track_info:
             return None
         
-        # Simple scoring system based on title similarity and duration
+        # Score by fuzzy title similarity, adjusted for duration and title keywords
         best_match = None
         best_score = 0
         
         expected_duration = track_info.get('duration_ms', 0) / 1000  # Convert to seconds
-        track_name = track_info.get('name', '').lower()
-        artists = [artist.lower() for artist in track_info.get('artists', [])]
+        expected_title = f"{track_info.get('artists_joined', '')} {track_info.get('name', '')}"
         
         for result in search_results:
-            score = 0
-            title = result.get('title', '').lower()
+            title = result.get('title') or ''
             duration = result.get('duration', 0)
             
-            # Score based on title containing track name
-            if track_name in title:
-                score += 50
+            # Rule out results of the wrong length before the more expensive title comparison
+            duration_diff = None
+            if duration and expected_duration:
+                duration_diff = abs(duration - expected_duration)
+                if duration_diff > MAX_DURATION_DIFF:
+                    continue
             
-            # Score based on title containing artist names
-            for artist in artists:
-                if artist in title:
-                    score += 30
+            # Token-set similarity ignores word order and extra words like "(Official Video)"
+            score = fuzz.token_set_ratio(
+                expected_title, title,
+                processor=fuzz_utils.default_process,
+                score_cutoff=MIN_TITLE_SIMILARITY
+            )
+            if not score:
+                continue
             
             # Score based on duration similarity (if available)
-            if duration and expected_duration:
-                duration_diff = abs(duration - expected_duration)
+            if duration_diff is not None:
                 if duration_diff < 10:  # Within 10 seconds
                     score += 20
                 elif duration_diff < 30:  # Within 30 seconds
                     score += 10
             
-            # Prefer official/music videos
-            if any(keyword in title for keyword in ['official', 'music video', 'audio']):
+            # Prefer official/music videos and penalize live versions, covers, etc.
+            if self._BOOST_RE.search(title):
                 score += 15
-            
-            # Penalize live versions, covers, etc.
-            if any(keyword in title for keyword in ['live', 'cover', 'remix', 'karaoke']):
+            if self._PENALTY_RE.search(title):
                 score -= 20
             
             if score > best_score:
@@ -164,3 +253,13 @@ class YouTubeHandler:
             return None, "Failed to download audio"
         
         return downloaded_file, None
+
+# Handler owned by a download worker process, created on first use
+_worker_handler = None
+
+def download_track(search_query, track_info):
+    """Search for and download a track; runs in a download worker process."""
+    global _worker_handler
+    if _worker_handler is None:
+        _worker_handler = YouTubeHandler()
+    return _worker_handler.process_download_request(search_query, track_info)